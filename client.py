@@ -0,0 +1,158 @@
+"""
+A thin client for the akpytemp render server
+
+This module deliberately imports nothing from the package except utils, so
+that it can be run directly as a script to keep start-up time to a minimum:
+
+    python client.py -D name=value path/to/file.template
+"""
+import json
+import os
+import stat
+import socket
+import sys
+import time
+try:
+    from .utils import parse_defines
+except ImportError:
+    # run as a script from the package directory
+    from utils import parse_defines
+
+
+class ServerUnreachableError(IOError):
+    """The render server is not running or refuses connections"""
+
+
+def default_socket_path():
+    """
+    The default Unix domain socket path of the render server, in
+    $XDG_RUNTIME_DIR if available, or else in a private directory under the
+    temporary directory
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        runtime_dir = os.path.join(
+                os.environ.get('TMPDIR', '/tmp'), 'akpytemp-%d' % os.getuid())
+    return os.path.join(runtime_dir, 'akpytemp.sock')
+
+
+def check_owner(path, private=False):
+    """
+    Raise IOError if path is not owned by the current user, or if private and
+    it is accessible by other users
+    """
+    path_stat = os.lstat(path)
+    if path_stat.st_uid != os.getuid():
+        raise IOError('"%s" is not owned by the current user' % path)
+    if private and path_stat.st_mode & 0o077:
+        raise IOError('"%s" is accessible by other users' % path)
+    return path_stat
+
+
+def check_socket(path):
+    """
+    Raise IOError unless path is a socket owned by the current user
+    """
+    if not stat.S_ISSOCK(check_owner(path).st_mode):
+        raise IOError('"%s" is not a socket' % path)
+
+
+def wait_for_server(socket_path, timeout=10):
+    """
+    Wait until the render server accepts connections at socket_path, raise
+    ServerUnreachableError if it does not within timeout seconds
+    """
+    deadline = time.time() + timeout
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            return
+        except socket.error as e:
+            if time.time() >= deadline:
+                raise ServerUnreachableError(
+                        'Render server did not start at "%s": %s' %
+                        (socket_path, e))
+            time.sleep(0.05)
+        finally:
+            sock.close()
+
+
+def request(socket_path, path=None, template=None, outputdir=None,
+        namespace=None, cwd=None):
+    """
+    Send a render request to the server, return the response dictionary
+    containing 'status', 'output', 'stdout', 'stderr' and 'error'
+    """
+    req = {
+            'cwd': os.path.abspath(cwd or os.getcwd()),
+            'path': os.path.abspath(path) if path else None,
+            'template': template,
+            'outputdir': os.path.abspath(outputdir) if outputdir else None,
+            'namespace': namespace or {},
+            'environ': dict(os.environ), }
+    if not os.path.lexists(socket_path):
+        raise ServerUnreachableError('"%s" does not exist' % socket_path)
+    check_socket(socket_path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except socket.error as e:
+            raise ServerUnreachableError(str(e))
+        sock.sendall((json.dumps(req) + '\n').encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        f = sock.makefile('rb')
+        response = f.readline()
+        f.close()
+    finally:
+        sock.close()
+    if not response:
+        raise IOError('No response from render server at "%s"' %
+                socket_path)
+    return json.loads(response.decode('utf-8'))
+
+
+def main():
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] [template ...]')
+    parser.add_option('-o', '--outputdir', dest='outputdir')
+    parser.add_option('-s', '--socket', dest='socket',
+            default=default_socket_path())
+    parser.add_option('-D', '--define', dest='defines',
+            action='append', default=[])
+    (options, args) = parser.parse_args()
+    try:
+        namespace = parse_defines(options.defines)
+    except ValueError as e:
+        parser.error(str(e))
+    if args:
+        requests = [{'path': path} for path in args]
+    else:
+        requests = [{'template': sys.stdin.read()}]
+    for req in requests:
+        try:
+            response = request(
+                    options.socket, outputdir=options.outputdir,
+                    namespace=namespace, **req)
+        except ServerUnreachableError as e:
+            sys.stderr.write(
+                    'Unable to reach render server at "%s": %s\n'
+                    'Start it with "python -m akpytemp.template --daemon".\n'
+                    % (options.socket, e))
+            return 2
+        except (IOError, OSError, ValueError) as e:
+            sys.stderr.write(
+                    'Render server at "%s" failed: %s\n' % (options.socket, e))
+            return 2
+        sys.stdout.write(response['stdout'])
+        sys.stdout.write(response['output'])
+        sys.stdout.flush()
+        sys.stderr.write(response['stderr'])
+        if response['status']:
+            sys.stderr.write(response['error'])
+            return response['status']
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
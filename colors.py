@@ -8,18 +8,28 @@ def set_color_enable(enable):
 
 def check_enable(color):
     global __color_enable
-    if ('color' in os.environ['TERM']) and __color_enable:
+    if ('color' in os.environ.get('TERM', '')) and __color_enable:
         return color
     else:
         return ''
 
+_color_codes = {
+        'HEADER': '\033[95m',
+        'BLUE': '\033[94m',
+        'GREEN': '\033[92m',
+        'WARNING': '\033[93m',
+        'FAIL': '\033[91m',
+        'END': '\033[0m', }
+
 class Colors(object):
     """A class with terminal colors
     This class defines a set of colors suitable for making colored outputs
     """
-    HEADER = check_enable('\033[95m')
-    BLUE = check_enable('\033[94m')
-    GREEN = check_enable('\033[92m')
-    WARNING = check_enable('\033[93m')
-    FAIL = check_enable('\033[91m')
-    END = check_enable('\033[0m')
+    HEADER = BLUE = GREEN = WARNING = FAIL = END = ''
+
+def update_colors():
+    """Enable or disable colors according to the current environment"""
+    for name, code in _color_codes.items():
+        setattr(Colors, name, check_enable(code))
+
+update_colors()
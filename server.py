@@ -0,0 +1,249 @@
+from .template import Template
+from .colors import update_colors
+from .client import default_socket_path, check_owner, check_socket
+import os
+import io
+import sys
+import json
+import collections
+import signal
+import socket
+import traceback
+import socketserver
+
+
+class TemplateCacheEntry(object):
+    """A template file loaded in memory, with its lexed and compiled forms"""
+    def __init__(self, stamp, source):
+        self.stamp = stamp
+        self.source = source
+        self.lexed = None
+        self.code = {}
+
+
+class TemplateCache(object):
+    """
+    Template files keyed by path, invalidated by modification time, the least
+    recently used are evicted beyond max_entries
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def _stamp(self, path):
+        stat = os.stat(path)
+        return getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size
+
+    def entry(self, path):
+        """
+        Find the entry for the template file at path, reload it if the file
+        has been modified since it was last loaded
+        """
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            self._entries.pop(path, None)
+            raise
+        entry = self._entries.get(path)
+        if entry is None or entry.stamp != stamp:
+            with open(path) as f:
+                entry = TemplateCacheEntry(stamp, f.read())
+            self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CachedTemplate(Template):
+    """
+    A template which reuses loaded, lexed and compiled template files across
+    renders, included templates are cached in the same way
+    """
+    _cache = TemplateCache()
+
+    def __init__(self, template=None, path=None, include_path=None):
+        self._entry = None
+        if not template and path:
+            self._entry = self._cache.entry(os.path.abspath(path))
+            template = self._entry.source
+        Template.__init__(self, template, path, include_path)
+
+    def _new_include(self, path):
+        return CachedTemplate(path=path)
+
+    def _lex(self, template):
+        if not self._entry or template is not self._template:
+            return Template._lex(self, template)
+        if self._entry.lexed is None:
+            self._entry.lexed = Template._lex(self, template)
+        return self._entry.lexed
+
+    def _compile(self, block, name):
+        if not self._entry:
+            return Template._compile(self, block, name)
+        code = self._entry.code.get(block)
+        if code is None:
+            code = Template._compile(self, block, name)
+            self._entry.code[block] = code
+        return code
+
+
+class TemplateRequestHandler(socketserver.StreamRequestHandler):
+    """Handle a single JSON encoded render request"""
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # connection probe without a request
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            response = self.server.render(request)
+        except Exception:
+            response = {
+                    'status': 2, 'output': '', 'stdout': '', 'stderr': '',
+                    'error': 'Render server failed to handle request:\n' +
+                        traceback.format_exc(), }
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class TemplateServer(socketserver.UnixStreamServer):
+    """
+    A render server listening on a Unix domain socket
+
+    Templates stay loaded between requests in a single process. Requests are
+    served one at a time, as rendering changes the working directory,
+    sys.path, environment, sys.stdout and sys.stderr of the process. Python
+    modules imported while rendering are dropped afterwards, so that each
+    render imports them afresh as the command line utility would. Requires
+    Python 3.
+    """
+    # seconds between checks for termination while waiting for requests
+    timeout = 0.5
+
+    def __init__(self, socket_path=None, template_class=CachedTemplate):
+        self._terminated = False
+        socket_path = socket_path or default_socket_path()
+        if socket_path == default_socket_path():
+            self._make_private_dir(os.path.dirname(socket_path))
+        if os.path.lexists(socket_path):
+            self._remove_stale_socket(socket_path)
+        self.template_class = template_class
+        socketserver.UnixStreamServer.__init__(
+                self, socket_path, TemplateRequestHandler)
+
+    def _make_private_dir(self, path):
+        if not os.path.exists(path):
+            os.makedirs(path, 0o700)
+        check_owner(path, private=True)
+
+    def _remove_stale_socket(self, socket_path):
+        check_socket(socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except socket.error:
+            os.remove(socket_path)
+            return
+        finally:
+            sock.close()
+        raise IOError('A render server is already listening at "%s"' %
+                socket_path)
+
+    def server_bind(self):
+        # only the current user may connect, as templates run arbitrary code
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+
+    def terminate(self):
+        """
+        Stop serving after the request being handled, safe to call from a
+        signal handler
+        """
+        self._terminated = True
+
+    def serve_until_terminated(self):
+        """
+        Handle requests until terminate() is called
+        """
+        while not self._terminated:
+            self.handle_request()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+    def render(self, request):
+        """
+        Render a request, return a response dictionary with the rendered
+        output, anything written to stdout and stderr while rendering, and
+        the formatted error
+        """
+        response = {
+                'status': 0, 'output': '', 'stdout': '', 'stderr': '',
+                'error': '', }
+        cwd = os.getcwd()
+        modules = set(sys.modules)
+        path = list(sys.path)
+        environ = dict(os.environ)
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        try:
+            os.environ.clear()
+            os.environ.update(request['environ'])
+            update_colors()
+            os.chdir(request['cwd'])
+            # as sys.path[0] of "python -m akpytemp.template"
+            sys.path.insert(0, request['cwd'])
+            if request['path']:
+                template = self.template_class(path=request['path'])
+            else:
+                template = self.template_class(
+                        io.StringIO(request['template']))
+            namespace = dict(request['namespace'])
+            if request['outputdir']:
+                template.save(request['outputdir'], namespace=namespace)
+            else:
+                output = io.StringIO()
+                output.name = '<stdout>'
+                template.save(output, namespace=namespace)
+                response['output'] = output.getvalue()
+        except (Exception, SystemExit):
+            response['status'] = 1
+            response['error'] = traceback.format_exc()
+        finally:
+            response['stdout'] = sys.stdout.getvalue()
+            response['stderr'] = sys.stderr.getvalue()
+            sys.stdout, sys.stderr = stdout, stderr
+            os.chdir(cwd)
+            sys.path[:] = path
+            os.environ.clear()
+            os.environ.update(environ)
+            update_colors()
+            for name in set(sys.modules) - modules:
+                del sys.modules[name]
+        return response
+
+
+def serve(socket_path=None):
+    """
+    Serve render requests until interrupted
+    """
+    server = TemplateServer(socket_path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.terminate())
+    try:
+        server.serve_until_terminated()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,6 +1,7 @@
 from .colors import Colors
 from .utils import (
-    key_for_value, re_lookup_val, chop, code_gobble, _exec, _eval
+    key_for_value, re_lookup_val, chop, code_gobble, parse_defines, _exec,
+    _eval
 )
 from .exceptions import TemplateParentNotFoundError
 import re
@@ -240,7 +241,7 @@ class Template(object):
             include_file = os.path.join(self._include_path, path)
         else:
             include_file = os.path.join(self._dir, path)
-        include_template = Template(path=include_file)
+        include_template = self._new_include(include_file)
         include_template._parent = self
         # update namespace for rendering
         include_namespace = dict(**self._globals)
@@ -258,6 +259,12 @@ class Template(object):
         if emit:
             self.emit(include_result)
 
+    def _new_include(self, path):
+        """
+        Create the template instance for an included template file
+        """
+        return Template(path=path)
+
     def _render_r(self, lexed_template):
         """
         Recursive render calls
@@ -348,8 +355,10 @@ class Template(object):
         try:
             lexed_template = self._lex(self._template)
             sys.path.append(self._dir)
-            result = self._render_r(lexed_template)
-            sys.path.remove(self._dir)
+            try:
+                result = self._render_r(lexed_template)
+            finally:
+                sys.path.remove(self._dir)
         except SyntaxError:
             if not self._exc:
                 # print exception & source
@@ -381,17 +390,14 @@ class Template(object):
         Run a block of code, return the return value from the code
         """
         def eval_or_exec(block, globs, locls):
-            result = None
             name = self._path if self._path else repr(self)
-            try:
-                if not block.endswith('\n'):
-                    block += '\n'
-                code = compile(block, name, 'eval')
-                result = _eval(code, globs, locls)
-            except SyntaxError:
-                code = compile(block, name, 'exec')
-                _exec(code, globs, locls)
-            return result
+            if not block.endswith('\n'):
+                block += '\n'
+            code, is_expr = self._compile(block, name)
+            if is_expr:
+                return _eval(code, globs, locls)
+            _exec(code, globs, locls)
+            return None
         if not self._globals:
             self._globals = {}
         # make sure globals has the correct method calls
@@ -417,6 +423,16 @@ class Template(object):
         self._locals.clear()
         return result
 
+    def _compile(self, block, name):
+        """
+        Compile a block of code, return the code object and whether it is
+        an expression
+        """
+        try:
+            return compile(block, name, 'eval'), True
+        except SyntaxError:
+            return compile(block, name, 'exec'), False
+
     _exception_line_no_re = re.compile('line (\d+)')
 
     def _format_exception(self, line_no=0, line_offset=0, display_lines=2):
@@ -509,19 +525,32 @@ def main():
     parser.add_option('-o', '--outputdir', dest='outputdir')
     parser.add_option('-t', '--test',
             action='store_true', dest='should_test')
+    parser.add_option('-d', '--daemon',
+            action='store_true', dest='daemon')
+    parser.add_option('-s', '--socket', dest='socket')
+    parser.add_option('-D', '--define', dest='defines',
+            action='append', default=[])
     (options, args) = parser.parse_args()
     if options.should_test:
         import doctest
         doctest.testmod()
         return
+    if options.daemon:
+        from .server import serve
+        serve(options.socket)
+        return
+    try:
+        namespace = parse_defines(options.defines)
+    except ValueError as e:
+        parser.error(str(e))
     if options.outputdir:
         output_file = options.outputdir
     else:
         output_file = sys.stdout
     if len(args) == 0:
-        Template(sys.stdin).save(output_file)
+        Template(sys.stdin).save(output_file, namespace=namespace)
     else:
-        Template(path=args[0]).save(output_file)
+        Template(path=args[0]).save(output_file, namespace=namespace)
 
 if __name__ == '__main__':
     main()
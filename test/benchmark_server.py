@@ -0,0 +1,79 @@
+"""
+Compare per-file render latency of the command line utility against the
+render server and its thin client
+
+    python test/benchmark_server.py [-n 20] [template ...]
+"""
+import os
+import sys
+import time
+import shutil
+import importlib
+import tempfile
+import subprocess
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.dirname(test_dir)
+package_name = os.path.basename(package_dir)
+sys.path.insert(0, os.path.dirname(package_dir))
+wait_for_server = importlib.import_module(
+        package_name + '.client').wait_for_server
+
+
+def time_command(command, env, repeat):
+    """
+    Run command repeatedly, return the per-run wall time in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.check_call(
+                command, env=env, cwd=package_dir,
+                stdout=subprocess.DEVNULL)
+        timings.append(time.time() - start)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print('%-8s min %7.2f ms  median %7.2f ms  max %7.2f ms' % (
+            label, timings[0] * 1000, timings[len(timings) // 2] * 1000,
+            timings[-1] * 1000))
+
+
+def main():
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] [template ...]')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int',
+            default=20)
+    (options, args) = parser.parse_args()
+    templates = args or [os.path.join(test_dir, 'include_test.template')]
+    templates = [os.path.abspath(path) for path in templates]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(package_dir), env.get('PYTHONPATH', '')])
+    env.setdefault('TERM', 'dumb')
+    socket_dir = tempfile.mkdtemp(prefix='akpytemp-benchmark-')
+    socket_path = os.path.join(socket_dir, 'akpytemp.sock')
+    daemon = subprocess.Popen(
+            [sys.executable, '-m', package_name + '.template',
+                '--daemon', '--socket', socket_path],
+            env=env, cwd=package_dir)
+    try:
+        wait_for_server(socket_path)
+        for path in templates:
+            print(os.path.relpath(path, package_dir))
+            cli = [sys.executable, '-m', package_name + '.template', path]
+            client = [sys.executable, os.path.join(package_dir, 'client.py'),
+                    '--socket', socket_path, path]
+            # warm up the server cache and the file system
+            time_command(client, env, 1)
+            report('cli', time_command(cli, env, options.repeat))
+            report('client', time_command(client, env, options.repeat))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        shutil.rmtree(socket_dir)
+
+if __name__ == '__main__':
+    main()
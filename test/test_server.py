@@ -0,0 +1,209 @@
+"""
+Tests for the render server and its client
+
+    python test/test_server.py
+"""
+import os
+import sys
+import shutil
+import signal
+import socket
+import tempfile
+import importlib
+import threading
+import subprocess
+import unittest
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.dirname(test_dir)
+package_name = os.path.basename(package_dir)
+sys.path.insert(0, os.path.dirname(package_dir))
+# the environment is forwarded to the server, keep error output plain
+os.environ['TERM'] = 'dumb'
+server = importlib.import_module(package_name + '.server')
+client = importlib.import_module(package_name + '.client')
+
+
+class TemplateServerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='akpytemp-test-')
+        self.socket_path = os.path.join(self.dir, 'akpytemp.sock')
+        self.server = server.TemplateServer(self.socket_path)
+        self.thread = threading.Thread(
+                target=self.server.serve_until_terminated)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.terminate()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def render(self, **kwargs):
+        return client.request(self.socket_path, **kwargs)
+
+    def test_socket_is_private(self):
+        mode = os.stat(self.socket_path).st_mode
+        self.assertEqual(mode & 0o777, 0o600)
+
+    def test_namespace(self):
+        path = self.write('hello.template', 'Hello {# world #}!')
+        response = self.render(path=path, namespace={'world': 'world'})
+        self.assertEqual(response['status'], 0)
+        self.assertEqual(response['output'], 'Hello world!')
+
+    def test_stderr(self):
+        response = self.render(
+                template="{# import sys #}{# sys.stderr.write('err') #}")
+        self.assertEqual(response['stderr'], 'err')
+        self.assertEqual(response['output'], '3')
+
+    def test_stdin(self):
+        self.assertEqual(self.render(template='')['output'], '')
+        self.assertEqual(self.render(template='{# 1 + 1 #}')['output'], '2')
+
+    def test_outputdir(self):
+        path = self.write('out.template', '{# target_name() #}')
+        output_dir = os.path.join(self.dir, 'output')
+        os.mkdir(output_dir)
+        self.render(path=path, outputdir=output_dir)
+        with open(os.path.join(output_dir, 'out.template')) as f:
+            self.assertEqual(f.read(), 'out.template')
+
+    def test_error(self):
+        path = self.write('error.template', 'line\n{# 1 / 0 #}')
+        response = self.render(path=path)
+        self.assertEqual(response['status'], 1)
+        self.assertIn('ZeroDivisionError', response['error'])
+        self.assertIn('-->   2 |', response['stdout'])
+
+    def test_cache_reused(self):
+        path = self.write('cached.template', '{# 6 * 7 #}')
+        self.render(path=path)
+        entry = server.CachedTemplate._cache.entry(path)
+        lexed, code = entry.lexed, dict(entry.code)
+        self.assertIsNotNone(lexed)
+        self.assertTrue(code)
+        self.assertEqual(self.render(path=path)['output'], '42')
+        entry = server.CachedTemplate._cache.entry(path)
+        self.assertIs(entry.lexed, lexed)
+        self.assertEqual(entry.code, code)
+
+    def test_cache_evicted(self):
+        cache = server.TemplateCache(max_entries=2)
+        paths = [self.write('%d.template' % i, str(i)) for i in range(3)]
+        for path in paths:
+            cache.entry(path)
+        cache.entry(paths[1])
+        self.assertNotIn(paths[0], cache)
+        cache.entry(paths[0])
+        self.assertNotIn(paths[2], cache)
+        os.remove(paths[1])
+        self.assertRaises(OSError, cache.entry, paths[1])
+        self.assertNotIn(paths[1], cache)
+
+    def test_include_reloaded(self):
+        self.write('include.template', 'A')
+        path = self.write(
+                'main.template', "{# include('include.template') #}")
+        self.assertEqual(self.render(path=path)['output'], 'A')
+        self.write('include.template', 'BB')
+        self.assertEqual(self.render(path=path)['output'], 'BB')
+
+    def test_modules_not_shared(self):
+        for name in ['a', 'b']:
+            os.mkdir(os.path.join(self.dir, name))
+            self.write(os.path.join(name, 'helper.py'), 'X = %r' % name)
+            path = self.write(
+                    os.path.join(name, 't.template'),
+                    '{# import helper #}{# helper.X #}')
+            self.assertEqual(self.render(path=path)['output'], name)
+        self.assertNotIn('helper', sys.modules)
+
+    def test_cwd_importable(self):
+        os.mkdir(os.path.join(self.dir, 'sub'))
+        self.write('cwdmod.py', 'X = 42')
+        path = self.write(
+                os.path.join('sub', 'c.template'),
+                '{# import cwdmod #}{# cwdmod.X #}')
+        response = self.render(path=path, cwd=self.dir)
+        self.assertEqual(response['output'], '42')
+        self.assertNotIn(self.dir, sys.path)
+
+    def test_environ(self):
+        path = self.write(
+                'e.template',
+                "{# import os #}{# os.environ.get('FOO', 'unset') #}")
+        os.environ['FOO'] = 'bar'
+        try:
+            response = self.render(path=path)
+        finally:
+            del os.environ['FOO']
+        self.assertEqual(response['output'], 'bar')
+        self.assertEqual(self.render(path=path)['output'], 'unset')
+
+    def test_colors_follow_environ(self):
+        path = self.write('colors.template', '{# 1 / 0 #}')
+        os.environ['TERM'] = 'xterm-256color'
+        try:
+            response = self.render(path=path)
+        finally:
+            os.environ['TERM'] = 'dumb'
+        self.assertIn('\033[91m', response['stdout'])
+        response = self.render(path=path)
+        self.assertNotIn('\033[91m', response['stdout'])
+
+    def test_malformed_request(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock.sendall(b'not json\n')
+        sock.shutdown(socket.SHUT_WR)
+        response = sock.makefile('rb').readline()
+        sock.close()
+        self.assertIn(b'"status": 2', response)
+
+    def test_refuse_non_socket(self):
+        path = self.write('plain.sock', '')
+        self.assertRaises(IOError, server.TemplateServer, path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_refuse_running_server(self):
+        self.assertRaises(IOError, server.TemplateServer, self.socket_path)
+
+
+class TemplateDaemonTest(unittest.TestCase):
+    def test_terminate_during_render(self):
+        socket_dir = tempfile.mkdtemp(prefix='akpytemp-test-')
+        socket_path = os.path.join(socket_dir, 'akpytemp.sock')
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(package_dir)
+        daemon = subprocess.Popen(
+                [sys.executable, '-m', package_name + '.template',
+                    '--daemon', '--socket', socket_path],
+                env=env, stderr=subprocess.DEVNULL)
+        try:
+            client.wait_for_server(socket_path)
+            timer = threading.Timer(
+                    0.5, daemon.send_signal, [signal.SIGTERM])
+            timer.start()
+            response = client.request(
+                    socket_path,
+                    template='{# import time #}{# time.sleep(1) #}done')
+            timer.join()
+            self.assertEqual(response['status'], 0)
+            self.assertEqual(response['output'], 'done')
+            self.assertEqual(daemon.wait(timeout=5), 0)
+            self.assertFalse(os.path.exists(socket_path))
+        finally:
+            if daemon.poll() is None:
+                daemon.kill()
+            shutil.rmtree(socket_dir)
+
+if __name__ == '__main__':
+    unittest.main()
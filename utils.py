@@ -35,6 +35,20 @@ def chop(token_list, regex):
     return new_token_list
 
 
+def parse_defines(defines):
+    """
+    Turn a list of 'key=value' strings into a namespace dictionary
+    """
+    namespace = {}
+    for define in defines or []:
+        key, sep, val = define.partition('=')
+        if not sep:
+            raise ValueError('Invalid definition "%s", expect key=value' %
+                    define)
+        namespace[key] = val
+    return namespace
+
+
 def code_gobble(code, gobble_count=None, eat_empty_lines=False):
     ws_re = re.compile('^(\s+)')
     new_code_list = []